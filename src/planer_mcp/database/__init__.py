@@ -1,9 +1,11 @@
 from .manager import DatabaseManager
-from .models import Base, PlanModel, TaskModel
+from .models import Base, PlanModel, TaskModel, TaskDependencyModel, PlanTemplateModel
 
 __all__ = [
     "DatabaseManager",
     "Base",
     "PlanModel",
-    "TaskModel"
+    "TaskModel",
+    "TaskDependencyModel",
+    "PlanTemplateModel"
 ]
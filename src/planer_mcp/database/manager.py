@@ -1,28 +1,119 @@
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
-import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from sqlalchemy import create_engine, case
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import Connection, case, create_engine, delete, event, insert, inspect, select, update
+from sqlalchemy.orm import joinedload, noload, sessionmaker, Session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import tuple_
 
-from .models import Base, PlanModel, TaskModel
-from ..models.schemas import Plan, Task, TaskStatus, PlanCategory, Priority
+from .models import Base, PlanModel, TaskModel, TaskDependencyModel, PlanTemplateModel
+from .. import _json
+from ..models.schemas import Plan, Task, TaskStatus
+
+# 7 bound columns per task row keeps each batch below SQLite's 999-parameter limit.
+_INSERT_BATCH_SIZE = 100
+# Id lists are split so each IN (...) plus the SET values stays under the same limit.
+_IN_BATCH_SIZE = 900
+
+_SQLITE_PRAGMAS = (
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+# Indexes superseded by composite ones; dropped from databases created by older versions.
+_LEGACY_INDEXES = ("idx_tasks_plan_id", "idx_plans_updated_at")
+
+def _apply_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    # Leave transaction control to the "begin" hook instead of pysqlite's implicit BEGIN.
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in _SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+def _begin_transaction(conn: Connection) -> None:
+    # Writers take the lock up front so they never fail upgrading a read lock with SQLITE_BUSY.
+    if conn.get_execution_options().get("sqlite_immediate"):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        conn.exec_driver_sql("BEGIN")
 
 class DatabaseManager:
     def __init__(self, db_path: str = "plans.db") -> None:
         self.db_path = Path(db_path)
-        self.engine = create_engine(f"sqlite:///{self.db_path}")
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.engine = create_engine(
+            f"sqlite:///{self.db_path}",
+            poolclass=QueuePool,
+            pool_size=10,
+            max_overflow=20,
+            pool_timeout=30,
+            pool_recycle=1800,
+            pool_pre_ping=True,
+            pool_use_lifo=True,
+            connect_args={"check_same_thread": False}
+        )
+        event.listen(self.engine, "connect", _apply_sqlite_pragmas)
+        event.listen(self.engine, "begin", _begin_transaction)
+        self._migrate_schema()
+        self.SessionLocal = sessionmaker(bind=self.engine, expire_on_commit=False)
+        # Keyed on (plan_id, updated_at): every write bumps updated_at, so stale entries are never hit.
+        self._load_plan_cached = lru_cache(maxsize=128)(self._load_plan)
     
-    def _get_session(self) -> Session:
-        return self.SessionLocal()
+    def _migrate_schema(self) -> None:
+        # Startup may write, so it takes the write lock up front like any other writer.
+        with self.engine.connect().execution_options(sqlite_immediate=True) as conn, conn.begin():
+            Base.metadata.create_all(conn)
+            inspector = inspect(conn)
+            for table in Base.metadata.sorted_tables:
+                existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in existing_columns:
+                        column_ddl = CreateColumn(column).compile(dialect=self.engine.dialect)
+                        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+            
+            # Baseline rows used CURRENT_TIMESTAMP ('YYYY-MM-DD HH:MM:SS'), which sorts and binds
+            # differently from SQLAlchemy's microsecond text and breaks the keyset cursor.
+            for column in ("created_at", "updated_at"):
+                conn.exec_driver_sql(f"UPDATE plans SET {column} = {column} || '.000000' WHERE length({column}) = 19")
+            
+            for index_name in _LEGACY_INDEXES:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index_name}")
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+            
+            # Collect planner statistics once; analysis_limit caps the rows sampled per index.
+            if not self._has_statistics(conn):
+                conn.exec_driver_sql("PRAGMA analysis_limit=400")
+                conn.exec_driver_sql("ANALYZE")
+    
+    @staticmethod
+    def _has_statistics(conn: Connection) -> bool:
+        has_table = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).first()
+        return bool(has_table) and conn.exec_driver_sql("SELECT 1 FROM sqlite_stat1 LIMIT 1").first() is not None
+    
+    @contextmanager
+    def _write_session(self) -> Iterator[Session]:
+        with self.SessionLocal.begin() as session:
+            session.connection(execution_options={"sqlite_immediate": True})
+            yield session
     
     def create_plan(self, plan: Plan) -> Plan:
-        session = self._get_session()
-        try:
+        with self._write_session() as session:
             plan_model = PlanModel(
                 title=plan.title,
                 description=plan.description,
@@ -34,28 +125,7 @@ class DatabaseManager:
             session.add(plan_model)
             session.flush()
             
-            created_tasks = []
-            for i, task in enumerate(plan.tasks):
-                task_model = TaskModel(
-                    plan_id=plan_model.id,
-                    title=task.title,
-                    description=task.description,
-                    status=task.status.value,
-                    priority=task.priority.value,
-                    order_index=i,
-                    dependencies=json.dumps(task.dependencies)
-                )
-                session.add(task_model)
-                session.flush()
-                
-                task.id = task_model.id
-                task.plan_id = plan_model.id
-                task.created_at = task_model.created_at
-                task.updated_at = task_model.updated_at
-                created_tasks.append(task)
-            
-            session.commit()
-            session.refresh(plan_model)
+            created_tasks = self._insert_tasks(session, plan_model.id, plan.tasks, start_index=0)
             
             plan.id = plan_model.id
             plan.created_at = plan_model.created_at
@@ -65,188 +135,263 @@ class DatabaseManager:
             plan.tasks = created_tasks
             
             return plan
-        finally:
-            session.close()
     
-    def get_plan(self, plan_id: int) -> Optional[Plan]:
-        session = self._get_session()
-        try:
-            plan_model = session.query(PlanModel).filter(PlanModel.id == plan_id).first()
-            if not plan_model:
-                return None
-            
-            task_models = session.query(TaskModel).filter(
-                TaskModel.plan_id == plan_id
-            ).order_by(TaskModel.order_index).all()
-            
-            tasks = []
-            for task_model in task_models:
-                tasks.append(Task(
-                    id=task_model.id,
-                    plan_id=task_model.plan_id,
-                    title=task_model.title,
-                    description=task_model.description,
-                    status=TaskStatus(task_model.status),
-                    priority=Priority(task_model.priority),
-                    order_index=task_model.order_index,
-                    dependencies=json.loads(task_model.dependencies) if task_model.dependencies else [],
-                    created_at=task_model.created_at,
-                    updated_at=task_model.updated_at,
-                    completed_at=task_model.completed_at
-                ))
-            
-            return Plan(
-                id=plan_model.id,
-                title=plan_model.title,
-                description=plan_model.description,
-                category=PlanCategory(plan_model.category),
-                goal=plan_model.goal,
-                status=TaskStatus(plan_model.status),
-                total_tasks=plan_model.total_tasks,
-                completed_tasks=plan_model.completed_tasks,
-                created_at=plan_model.created_at,
-                updated_at=plan_model.updated_at,
-                tasks=tasks
+    def _insert_tasks(self, session: Session, plan_id: int, tasks: List[Task], start_index: int) -> List[Task]:
+        rows: List[Dict[str, Any]] = [
+            {
+                "plan_id": plan_id,
+                "title": task.title,
+                "description": task.description,
+                "status": task.status.value,
+                "priority": task.priority.value,
+                "order_index": start_index + i
+            }
+            for i, task in enumerate(tasks)
+        ]
+        
+        # render_nulls keeps rows with and without a description in one multi-row INSERT.
+        stmt = (
+            insert(TaskModel)
+            .returning(TaskModel.id, TaskModel.created_at, TaskModel.updated_at)
+            .execution_options(render_nulls=True)
+        )
+        
+        for batch_start in range(0, len(rows), _INSERT_BATCH_SIZE):
+            batch = rows[batch_start:batch_start + _INSERT_BATCH_SIZE]
+            # SQLite assigns rowids in VALUES order within one statement, so sorting the
+            # unordered RETURNING rows by id lines them up with the batch.
+            returned = sorted(session.execute(stmt, batch), key=lambda row: row.id)
+            for task, row in zip(tasks[batch_start:batch_start + _INSERT_BATCH_SIZE], returned):
+                task.id = row.id
+                task.plan_id = plan_id
+                task.created_at = row.created_at
+                task.updated_at = row.updated_at
+        
+        dependency_rows = [
+            {"task_id": task.id, "depends_on_index": dep}
+            for task in tasks
+            for dep in task.dependencies
+        ]
+        for batch_start in range(0, len(dependency_rows), _INSERT_BATCH_SIZE):
+            session.execute(
+                insert(TaskDependencyModel),
+                dependency_rows[batch_start:batch_start + _INSERT_BATCH_SIZE]
             )
-        finally:
-            session.close()
+        
+        return list(tasks)
     
-    def get_all_plans(self, include_completed: bool = False, page: int = 1, page_size: int = 30) -> List[Plan]:
-        session = self._get_session()
-        try:
-            query = session.query(PlanModel)
+    def get_plan(self, plan_id: int) -> Optional[Plan]:
+        with self.SessionLocal.begin() as session:
+            updated_at = session.scalar(select(PlanModel.updated_at).where(PlanModel.id == plan_id))
+        if updated_at is None:
+            return None
+        
+        plan = self._load_plan_cached(plan_id, updated_at)
+        return plan.model_copy(deep=True) if plan else None
+    
+    def _load_plan(self, plan_id: int, updated_at: datetime) -> Optional[Plan]:
+        with self.SessionLocal.begin() as session:
+            return self._load_plan_in(session, plan_id)
+    
+    def _load_plan_in(self, session: Session, plan_id: int) -> Optional[Plan]:
+        plan_model = session.get(PlanModel, plan_id, options=[
+            joinedload(PlanModel.tasks).selectinload(TaskModel.dependencies_rel)
+        ])
+        if not plan_model:
+            return None
+        
+        return self._to_plan(plan_model)
+    
+    def _to_plan(self, plan_model: PlanModel) -> Plan:
+        plan = Plan.model_validate(plan_model)
+        plan._stored_pct = plan_model.progress_pct
+        return plan
+    
+    def get_all_plans(self, include_completed: bool = False,
+                      cursor: Optional[Tuple[datetime, int]] = None,
+                      page_size: int = 30) -> Tuple[List[Plan], Optional[Tuple[datetime, int]]]:
+        with self.SessionLocal.begin() as session:
+            query = session.query(PlanModel).options(noload(PlanModel.tasks))
             
             if not include_completed:
+                query = query.filter(PlanModel.is_active)
+            
+            if cursor is not None:
                 query = query.filter(
-                    (PlanModel.total_tasks == 0) | 
-                    (PlanModel.completed_tasks < PlanModel.total_tasks)
+                    tuple_(PlanModel.updated_at, PlanModel.id) < tuple_(cursor[0], cursor[1])
                 )
             
-            query = query.order_by(PlanModel.updated_at.desc())
-            
-            offset = (page - 1) * page_size
-            query = query.offset(offset).limit(page_size)
+            # One extra row tells whether another page exists without a follow-up query.
+            query = query.order_by(PlanModel.updated_at.desc(), PlanModel.id.desc()).limit(page_size + 1)
             
             plan_models = query.all()
+            has_more = len(plan_models) > page_size
             
-            plans = []
-            for plan_model in plan_models:
-                plans.append(Plan(
-                    id=plan_model.id,
-                    title=plan_model.title,
-                    description=plan_model.description,
-                    category=PlanCategory(plan_model.category),
-                    goal=plan_model.goal,
-                    status=TaskStatus(plan_model.status),
-                    total_tasks=plan_model.total_tasks,
-                    completed_tasks=plan_model.completed_tasks,
-                    created_at=plan_model.created_at,
-                    updated_at=plan_model.updated_at,
-                    tasks=[]
-                ))
+            plans = [self._to_plan(plan_model) for plan_model in plan_models[:page_size]]
             
-            return plans
-        finally:
-            session.close()
+            next_cursor = None
+            if has_more:
+                next_cursor = (plans[-1].updated_at, plans[-1].id)
+            
+            return plans, next_cursor
     
     def update_task_status(self, task_ids: List[int], status: TaskStatus, notes: Optional[str] = None) -> bool:
-        session = self._get_session()
-        try:
-            update_time = datetime.now()
-            completed_time = update_time if status == TaskStatus.COMPLETED else None
-            
-            affected_tasks = session.query(TaskModel).filter(TaskModel.id.in_(task_ids)).all()
-            if not affected_tasks:
-                return False
-            
-            for task in affected_tasks:
-                task.status = status.value
-                task.updated_at = update_time
-                if completed_time:
-                    task.completed_at = completed_time
-            
-            affected_plan_ids = set(task.plan_id for task in affected_tasks)
-            
-            for plan_id in affected_plan_ids:
-                self._update_plan_progress(session, plan_id)
-            
-            session.commit()
-            return True
-        finally:
-            session.close()
-    
-    def _update_plan_progress(self, session: Session, plan_id: int) -> None:
-        result = session.query(
-            func.count(TaskModel.id).label('total'),
-            func.sum(case((TaskModel.status == 'completed', 1), else_=0)).label('completed')
-        ).filter(
-            TaskModel.plan_id == plan_id,
-            TaskModel.status != 'deleted'
-        ).first()
+        with self._write_session() as session:
+            return self._update_task_status(session, task_ids, status)
+    
+    def update_task_status_and_fetch(self, plan_id: int, task_ids: List[int], status: TaskStatus,
+                                     notes: Optional[str] = None) -> Tuple[bool, Optional[Plan]]:
+        with self._write_session() as session:
+            if not self._update_task_status(session, task_ids, status):
+                return False, None
+            return True, self._load_plan_in(session, plan_id)
+    
+    def _update_task_status(self, session: Session, task_ids: List[int], status: TaskStatus) -> bool:
+        update_time = datetime.now()
         
-        total = result.total or 0
-        completed = result.completed or 0
+        values: Dict[str, Any] = {"status": status.value, "updated_at": update_time}
+        if status == TaskStatus.COMPLETED:
+            values["completed_at"] = update_time
         
-        plan = session.query(PlanModel).filter(PlanModel.id == plan_id).first()
-        if plan:
-            plan.total_tasks = total
-            plan.completed_tasks = completed
-            plan.updated_at = datetime.now()
+        unique_ids = list(dict.fromkeys(task_ids))
+        affected_plan_ids = set()
+        for batch_start in range(0, len(unique_ids), _IN_BATCH_SIZE):
+            affected_plan_ids.update(session.scalars(
+                update(TaskModel)
+                .where(TaskModel.id.in_(unique_ids[batch_start:batch_start + _IN_BATCH_SIZE]))
+                .values(**values)
+                .returning(TaskModel.plan_id)
+                .execution_options(synchronize_session=False)
+            ))
+        
+        if not affected_plan_ids:
+            return False
+        
+        self._update_plan_progress(session, affected_plan_ids)
+        return True
+    
+    def _update_plan_progress(self, session: Session, plan_ids: Iterable[int]) -> None:
+        total_tasks = select(func.count(TaskModel.id)).where(
+            TaskModel.plan_id == PlanModel.id,
+            TaskModel.status != TaskStatus.DELETED.value
+        ).scalar_subquery()
+        completed_tasks = select(func.count(TaskModel.id)).where(
+            TaskModel.plan_id == PlanModel.id,
+            TaskModel.status == TaskStatus.COMPLETED.value
+        ).scalar_subquery()
+        
+        # SET expressions see the pre-update row, so the percentage reuses the subqueries.
+        progress_pct = case(
+            (total_tasks == 0, 0.0),
+            else_=completed_tasks * 100.0 / total_tasks
+        )
+        
+        session.execute(
+            update(PlanModel)
+            .where(PlanModel.id.in_(list(plan_ids)))
+            .values(
+                total_tasks=total_tasks,
+                completed_tasks=completed_tasks,
+                progress_pct=progress_pct,
+                updated_at=datetime.now()
+            )
+            .execution_options(synchronize_session=False)
+        )
     
     def add_tasks_to_plan(self, plan_id: int, new_tasks: List[Task]) -> bool:
-        session = self._get_session()
-        try:
-            max_index = session.query(func.max(TaskModel.order_index)).filter(
-                TaskModel.plan_id == plan_id
-            ).scalar() or -1
-            
-            for i, task in enumerate(new_tasks):
-                task_model = TaskModel(
-                    plan_id=plan_id,
-                    title=task.title,
-                    description=task.description,
-                    status=task.status.value,
-                    priority=task.priority.value,
-                    order_index=max_index + 1 + i,
-                    dependencies=json.dumps(task.dependencies)
-                )
-                session.add(task_model)
-            
-            self._update_plan_progress(session, plan_id)
-            session.commit()
-            return True
-        finally:
-            session.close()
+        with self._write_session() as session:
+            return self._add_tasks(session, plan_id, new_tasks)
+    
+    def _add_tasks(self, session: Session, plan_id: int, new_tasks: List[Task]) -> bool:
+        added_total = sum(1 for task in new_tasks if task.status != TaskStatus.DELETED)
+        added_completed = sum(1 for task in new_tasks if task.status == TaskStatus.COMPLETED)
+        total_tasks = PlanModel.total_tasks + added_total
+        completed_tasks = PlanModel.completed_tasks + added_completed
+        
+        result = session.execute(
+            update(PlanModel)
+            .where(PlanModel.id == plan_id)
+            .values(
+                total_tasks=total_tasks,
+                completed_tasks=completed_tasks,
+                progress_pct=case(
+                    (total_tasks == 0, 0.0),
+                    else_=completed_tasks * 100.0 / total_tasks
+                ),
+                updated_at=datetime.now()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            return False
+        
+        max_index = session.scalar(
+            select(func.coalesce(func.max(TaskModel.order_index), -1))
+            .where(TaskModel.plan_id == plan_id)
+        )
+        
+        self._insert_tasks(session, plan_id, new_tasks, start_index=max_index + 1)
+        
+        return True
     
     def update_plan_info(self, plan_id: int, title: Optional[str] = None, 
                         description: Optional[str] = None) -> bool:
-        session = self._get_session()
-        try:
-            plan = session.query(PlanModel).filter(PlanModel.id == plan_id).first()
-            if not plan:
-                return False
-            
-            if title:
-                plan.title = title
-            if description is not None:
-                plan.description = description
-            
-            plan.updated_at = datetime.now()
-            session.commit()
-            return True
-        finally:
-            session.close()
+        with self._write_session() as session:
+            return self._update_plan_info(session, plan_id, title, description)
+    
+    def _update_plan_info(self, session: Session, plan_id: int, title: Optional[str],
+                          description: Optional[str]) -> bool:
+        values: Dict[str, Any] = {"updated_at": datetime.now()}
+        if title:
+            values["title"] = title
+        if description is not None:
+            values["description"] = description
+        
+        result = session.execute(
+            update(PlanModel)
+            .where(PlanModel.id == plan_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+    
+    def update_plan_and_fetch(self, plan_id: int, title: Optional[str] = None,
+                              description: Optional[str] = None,
+                              new_tasks: Optional[List[Task]] = None) -> Optional[Plan]:
+        with self._write_session() as session:
+            if title or description:
+                self._update_plan_info(session, plan_id, title, description)
+            if new_tasks:
+                self._add_tasks(session, plan_id, new_tasks)
+            return self._load_plan_in(session, plan_id)
     
     def delete_plan(self, plan_id: int) -> bool:
-        session = self._get_session()
-        try:
-            plan = session.query(PlanModel).filter(PlanModel.id == plan_id).first()
-            if not plan:
-                return False
-            
-            session.delete(plan)
-            session.commit()
-            return True
-        finally:
-            session.close()
-
+        with self._write_session() as session:
+            result = session.execute(delete(PlanModel).where(PlanModel.id == plan_id))
+            return result.rowcount > 0
+    
+    def delete_plan_returning_title(self, plan_id: int) -> Optional[str]:
+        with self._write_session() as session:
+            return session.scalar(
+                delete(PlanModel).where(PlanModel.id == plan_id).returning(PlanModel.title)
+            )
+    
+    def get_plan_template(self, keyword: str) -> Optional[List[Dict[str, Any]]]:
+        with self.SessionLocal.begin() as session:
+            template_json = session.scalar(
+                select(PlanTemplateModel.template_json).where(PlanTemplateModel.keyword == keyword)
+            )
+        
+        return _json.loads(template_json) if template_json else None
+    
+    def save_plan_template(self, keyword: str, category: str, tasks: List[Dict[str, Any]]) -> None:
+        stmt = sqlite_insert(PlanTemplateModel).values(
+            keyword=keyword,
+            category=category,
+            template_json=_json.dumps(tasks)
+        )
+        with self._write_session() as session:
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[PlanTemplateModel.keyword],
+                set_={"category": stmt.excluded.category, "template_json": stmt.excluded.template_json}
+            ))
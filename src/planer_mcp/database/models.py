@@ -3,9 +3,10 @@ from pathlib import Path
 from typing import List, Optional
 import json
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy import create_engine, Column, Integer, Float, Boolean, String, Text, DateTime, ForeignKey, Index, Computed, true
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from sqlalchemy.sql import func
+
+from .. import _json
 
 Base = declarative_base()
 
@@ -20,14 +21,26 @@ class PlanModel(Base):
     status = Column(String(50), default="pending")
     total_tasks = Column(Integer, default=0)
     completed_tasks = Column(Integer, default=0)
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    progress_pct = Column(Float, default=0.0)
+    is_active = Column(Boolean, Computed("total_tasks = 0 OR completed_tasks < total_tasks", persisted=False))
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    tasks = relationship(
+        "TaskModel",
+        back_populates="plan",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="TaskModel.order_index",
+        lazy="raise"
+    )
     
-    tasks = relationship("TaskModel", back_populates="plan", cascade="all, delete-orphan")
+    __mapper_args__ = {"eager_defaults": True}
     
     __table_args__ = (
         Index('idx_plans_category', 'category'),
-        Index('idx_plans_updated_at', 'updated_at'),
+        Index('idx_plans_updated_id', 'updated_at', 'id'),
+        Index('idx_plans_active', 'updated_at', 'id', sqlite_where=is_active == true()),
     )
 
 class TaskModel(Base):
@@ -40,14 +53,49 @@ class TaskModel(Base):
     status = Column(String(50), default="pending")
     priority = Column(String(50), default="medium")
     order_index = Column(Integer, default=0)
-    dependencies = Column(Text, default="[]")
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # Legacy JSON list, superseded by task_dependencies and only read as a fallback; NULL on new rows.
+    dependencies_json = Column("dependencies", Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     completed_at = Column(DateTime, nullable=True)
     
     plan = relationship("PlanModel", back_populates="tasks")
+    dependencies_rel = relationship(
+        "TaskDependencyModel",
+        back_populates="task",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="TaskDependencyModel.id"
+    )
     
     __table_args__ = (
-        Index('idx_tasks_plan_id', 'plan_id'),
+        Index('idx_tasks_plan_status', 'plan_id', 'status'),
+        Index('idx_tasks_plan_order', 'plan_id', 'order_index'),
         Index('idx_tasks_status', 'status'),
     )
+    
+    @property
+    def dependencies(self) -> List[int]:
+        if self.dependencies_rel:
+            return [dep.depends_on_index for dep in self.dependencies_rel]
+        return _json.loads(self.dependencies_json) if self.dependencies_json else []
+
+class TaskDependencyModel(Base):
+    __tablename__ = "task_dependencies"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
+    depends_on_index = Column(Integer, nullable=False)
+    
+    task = relationship("TaskModel", back_populates="dependencies_rel")
+    
+    __table_args__ = (
+        Index('idx_deps_task', 'task_id'),
+    )
+
+class PlanTemplateModel(Base):
+    __tablename__ = "plan_templates"
+    
+    keyword = Column(String(200), primary_key=True)
+    category = Column(String(50), nullable=False)
+    template_json = Column(Text, nullable=False)
@@ -1,5 +1,6 @@
 from .schemas import (
     Task,
+    TaskCreate,
     Plan,
     PlanCategory,
     TaskStatus,
@@ -11,6 +12,7 @@ from .schemas import (
 
 __all__ = [
     "Task",
+    "TaskCreate",
     "Plan",
     "PlanCategory",
     "TaskStatus",
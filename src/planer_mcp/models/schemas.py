@@ -2,7 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 
 class TaskStatus(str, Enum):
     PENDING = "pending"
@@ -32,6 +32,8 @@ class Priority(str, Enum):
     CRITICAL = "critical"
 
 class Task(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
     id: Optional[int] = None
     plan_id: int
     title: str = Field(..., min_length=1, max_length=200)
@@ -43,8 +45,28 @@ class Task(BaseModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    
+    @classmethod
+    def bulk_new(cls, plan_id: int, title: str) -> "Task":
+        # Skips validation; callers must pass a title that already fits the field constraints.
+        return cls.model_construct(
+            plan_id=plan_id,
+            title=title,
+            priority=Priority.MEDIUM,
+            status=TaskStatus.PENDING,
+            order_index=0,
+            dependencies=[]
+        )
+
+class TaskCreate(BaseModel):
+    title: str = Field(..., min_length=1, max_length=200)
+    description: Optional[str] = Field(None, max_length=1000)
+    priority: Priority = Priority.MEDIUM
+    dependencies: List[int] = Field(default_factory=list)
 
 class Plan(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
     id: Optional[int] = None
     title: str = Field(..., min_length=1, max_length=200)
     description: Optional[str] = Field(None, max_length=1000)
@@ -57,8 +79,13 @@ class Plan(BaseModel):
     updated_at: Optional[datetime] = None
     tasks: List[Task] = Field(default_factory=list)
     
+    # Percentage persisted by the database layer; None for plans not loaded from it.
+    _stored_pct: Optional[float] = PrivateAttr(default=None)
+    
     @property
     def progress_percentage(self) -> float:
+        if self._stored_pct is not None:
+            return self._stored_pct
         if self.total_tasks == 0:
             return 0.0
         return (self.completed_tasks / self.total_tasks) * 100
@@ -1,21 +1,62 @@
-import json
-from typing import Dict, List, Any
+import re
+from typing import Any, Dict, List, Optional
 
-from ..models.schemas import Plan, Task, PlanRequest, PlanCategory, Priority, TaskStatus
+from pydantic import TypeAdapter, ValidationError
+
+from ..models.schemas import Plan, Task, TaskCreate, PlanRequest, PlanCategory, Priority, TaskStatus
+
+_TASK_LIST_ADAPTER = TypeAdapter(List[TaskCreate])
+
+_KEYWORD_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "of", "on", "or", "our", "that", "the", "this", "to", "we", "with", "build", "create",
+    "implement", "make", "new", "add", "set", "up", "get", "my"
+})
+_TEMPLATE_KEYWORD_WORDS = 3
 
 class PlanningEngine:
     def __init__(self) -> None:
         pass
     
-    def parse_llm_tasks(self, llm_response: str) -> List[Dict[str, Any]]:
+    def parse_llm_tasks(self, llm_response: str) -> List[TaskCreate]:
         try:
-            tasks = json.loads(llm_response)
-            if isinstance(tasks, list):
-                return tasks
-        except json.JSONDecodeError:
-            pass
+            return _TASK_LIST_ADAPTER.validate_json(llm_response)
+        except ValidationError:
+            return []
+    
+    def template_keyword(self, goal: str, category: PlanCategory) -> Optional[str]:
+        """Template cache key, or None when the goal is too vague to share a template."""
+        words = [w for w in re.findall(r"\w+", goal.casefold()) if w not in _KEYWORD_STOPWORDS]
+        if len(words) < _TEMPLATE_KEYWORD_WORDS:
+            return None
+        return f"{category.value}:{'-'.join(words[:_TEMPLATE_KEYWORD_WORDS])}"
+    
+    def generalize_tasks(self, tasks: List[Task], title: str, goal: str) -> List[Dict[str, Any]]:
+        # Whole-word matches only, goal first so a title inside the goal is kept with it.
+        replacements = [(re.compile(rf"(?<!\w){re.escape(text.strip())}(?!\w)", re.IGNORECASE), placeholder)
+                        for text, placeholder in ((goal, "{goal}"), (title, "{title}")) if text.strip()]
+        
+        def scrub(text: str) -> str:
+            for pattern, placeholder in replacements:
+                text = pattern.sub(placeholder, text)
+            return text
+        
+        return [
+            {
+                "title": scrub(task.title),
+                "description": scrub(task.description) if task.description else None,
+                "priority": task.priority.value,
+                "dependencies": task.dependencies
+            }
+            for task in tasks
+        ]
+    
+    def instantiate_template(self, template: List[Dict[str, Any]], title: str, goal: str) -> List[Dict[str, Any]]:
+        def fill(text: Optional[str]) -> Optional[str]:
+            return text.replace("{title}", title).replace("{goal}", goal) if text else text
         
-        return []
+        return [{**task, "title": fill(task.get("title")), "description": fill(task.get("description"))}
+                for task in template]
     
     def create_plan_from_tasks(self, request: PlanRequest, tasks: List[Task]) -> Plan:
         plan = Plan(
@@ -1,67 +1,70 @@
-from typing import List
+from typing import List, Optional
 
 from ..models.schemas import Plan, Task, TaskStatus, Priority
 
+# Keyed by the raw status string; str-valued enum members hash and compare equal to it.
+_STATUS_EMOJI: dict[str, str] = {
+    TaskStatus.PENDING.value: "⏳",
+    TaskStatus.IN_PROGRESS.value: "🔄",
+    TaskStatus.COMPLETED.value: "✅",
+    TaskStatus.DELETED.value: "🗑️"
+}
+
+_PRIORITY_ICON: dict[str, str] = {
+    Priority.LOW.value: "🟢",
+    Priority.MEDIUM.value: "🟡",
+    Priority.HIGH.value: "🟠",
+    Priority.CRITICAL.value: "🔴"
+}
+
 class PlanFormatter:
     @staticmethod
     def format_plan_summary(plan: Plan) -> str:
-        status_emoji = {
-            TaskStatus.PENDING: "⏳",
-            TaskStatus.IN_PROGRESS: "🔄",
-            TaskStatus.COMPLETED: "✅",
-            TaskStatus.DELETED: "🗑️"
-        }
-        
-        header = f"{status_emoji.get(plan.status, '📋')} {plan.title}\n"
-        header += f"Category: {plan.category.value.upper()}\n"
-        header += f"Goal: {plan.goal}\n"
-        header += f"Progress: {plan.completed_tasks}/{plan.total_tasks} tasks ({plan.progress_percentage:.1f}%)\n"
-        
-        return header
+        return (
+            f"{_STATUS_EMOJI.get(plan.status, '📋')} {plan.title}\n"
+            f"Category: {plan.category.value.upper()}\n"
+            f"Goal: {plan.goal}\n"
+            f"Progress: {plan.completed_tasks}/{plan.total_tasks} tasks ({plan.progress_percentage:.1f}%)\n"
+        )
     
     @staticmethod
-    def format_plan_detailed(plan: Plan) -> str:
-        result = PlanFormatter.format_plan_summary(plan)
+    def format_plan_detailed(plan: Plan, max_tasks: Optional[int] = None) -> str:
+        parts = [PlanFormatter.format_plan_summary(plan)]
         
         if plan.description:
-            result += f"\nDescription: {plan.description}\n"
+            parts.append(f"\nDescription: {plan.description}\n")
         
         if plan.tasks:
-            result += "\n📝 Tasks:\n"
-            for i, task in enumerate(plan.tasks, 1):
-                status_icon = {
-                    TaskStatus.PENDING: "⏳",
-                    TaskStatus.IN_PROGRESS: "🔄",
-                    TaskStatus.COMPLETED: "✅",
-                    TaskStatus.DELETED: "🗑️"
-                }.get(task.status, "•")
-                
-                priority_icon = {
-                    Priority.LOW: "🟢",
-                    Priority.MEDIUM: "🟡",
-                    Priority.HIGH: "🟠",
-                    Priority.CRITICAL: "🔴"
-                }.get(task.priority, "")
-                
-                result += f"\n{i}. {status_icon} {priority_icon} {task.title}"
+            parts.append("\n📝 Tasks:\n")
+            shown = plan.tasks if max_tasks is None else plan.tasks[:max_tasks]
+            for i, task in enumerate(shown, 1):
+                parts.append(
+                    f"\n{i}. {_STATUS_EMOJI.get(task.status, '•')} "
+                    f"{_PRIORITY_ICON.get(task.priority, '')} {task.title}"
+                )
                 if task.description:
-                    result += f"\n   {task.description}"
+                    parts.append(f"\n   {task.description}")
                 if task.dependencies:
                     deps = ", ".join(str(d+1) for d in task.dependencies)
-                    result += f"\n   Dependencies: {deps}"
+                    parts.append(f"\n   Dependencies: {deps}")
+            
+            hidden = len(plan.tasks) - len(shown)
+            if hidden > 0:
+                parts.append(f"\n\n... and {hidden} more tasks")
         
-        return result
+        return "".join(parts)
     
     @staticmethod
     def format_plans_list(plans: List[Plan]) -> str:
         if not plans:
             return "No plans found."
         
-        result = f"Found {len(plans)} plan(s):\n\n"
+        parts = [f"Found {len(plans)} plan(s):\n\n"]
         for plan in plans:
-            result += f"ID {plan.id}: {plan.title}\n"
-            result += f"  Category: {plan.category.value} | Progress: {plan.progress_percentage:.0f}%\n"
-            result += f"  Status: {plan.status.value} | Tasks: {plan.completed_tasks}/{plan.total_tasks}\n\n"
+            parts.append(
+                f"ID {plan.id}: {plan.title}\n"
+                f"  Category: {plan.category.value} | Progress: {plan.progress_percentage:.0f}%\n"
+                f"  Status: {plan.status.value} | Tasks: {plan.completed_tasks}/{plan.total_tasks}\n\n"
+            )
         
-        return result
-
+        return "".join(parts)
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Dict
 
 from ..models.schemas import PlanCategory
@@ -143,14 +144,11 @@ Emphasize safety, testing, and gradual improvement.
     @classmethod
     def get_planning_prompt(cls, goal: str, category: PlanCategory, 
                           description: str = "", additional_context: str = "") -> str:
-        category_guidance = cls.CATEGORY_SPECIFIC.get(category, "")
-        
-        return cls.BASE_PROMPT.format(
+        return _category_template(category).format(
             goal=goal,
-            category=category.value,
             description=description or "No description provided.",
             additional_context=additional_context or "No additional context provided."
-        ) + "\n" + category_guidance
+        )
 
     @classmethod
     def get_update_prompt(cls, plan_title: str, current_tasks: str, 
@@ -178,3 +176,12 @@ Respond with a JSON object containing:
 
 Focus on maintaining plan coherence while implementing the requested updates.
 """
+
+
+@lru_cache(maxsize=16)
+def _category_template(category: PlanCategory) -> str:
+    # Fills in the per-category parts once; goal, description and context stay as format fields.
+    base = PlanningPrompts.BASE_PROMPT.replace("{category}", category.value)
+    # Guidance is literal text, so escape braces before it goes through str.format.
+    guidance = PlanningPrompts.CATEGORY_SPECIFIC.get(category, "").replace("{", "{{").replace("}", "}}")
+    return base + "\n" + guidance
@@ -1,11 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from enum import Enum
-from typing import Any
+from functools import partial
+from typing import Any, Callable, TypeVar
 
 from fastmcp import FastMCP, Context
+from mcp.types import SamplingMessage, TextContent
 
+from src.planer_mcp import _json
 from src.planer_mcp.database import DatabaseManager
 from src.planer_mcp.models import Plan, PlanRequest, TaskStatus, Priority, Task, PlanCategory
 from src.planer_mcp.planning import PlanningEngine, PlanFormatter
@@ -13,54 +22,139 @@ from src.planer_mcp.prompts import PlanningPrompts
 
 mcp = FastMCP("Planer")
 
+_DEBUG = bool(os.environ.get("PLANER_DEBUG"))
+
+_DB: DatabaseManager | None = None
+_DB_EXEC = ThreadPoolExecutor(max_workers=4, thread_name_prefix="planer-db")
+
+_T = TypeVar("_T")
+
+# Rendered plans keyed by id; an entry is only reused while the plan's updated_at is unchanged.
+_FORMAT_CACHE: OrderedDict[int, tuple[datetime | None, str]] = OrderedDict()
+_FORMAT_CACHE_SIZE = 256
+
+_RAW_DECODER = json.JSONDecoder()
+_JSON_DELIMITERS = {"array": ("[", "]"), "object": ("{", "}")}
+
+_JSON_ONLY_REMINDER = "IMPORTANT: You MUST respond with ONLY a valid JSON array of task objects. No explanations, no markdown, just the JSON array."
+
+_PREVIEW_TASK_LIMIT = 25
+# Requests with at least this much input text go straight to generation without the analysis sample.
+_ANALYSIS_SKIP_THRESHOLD = 300
+
+# Mirror the Task field limits; tasks built from LLM output skip validation.
+_TITLE_MAX = 200
+_DESCRIPTION_MAX = 1000
+
+_CANCEL_WORDS = frozenset({"cancel", "abort"})
+
+_CATEGORY_MAP = {c.value: c for c in PlanCategory}
+_PRIORITY_MAP = {p.value: p for p in Priority}
+_STATUS_MAP = {s.value: s for s in TaskStatus}
+_CATEGORY_CSV = ", ".join(_CATEGORY_MAP)
+_STATUS_CSV = ", ".join(_STATUS_MAP)
+
 
 def _get_db() -> DatabaseManager:
-    if not hasattr(_get_db, '_instance'):
-        _get_db._instance = DatabaseManager("plans.db")
-    return _get_db._instance
+    global _DB
+    if _DB is None:
+        _DB = DatabaseManager("plans.db")
+    return _DB
 
 
-def _extract_json_from_text(text: str, expected_type: str = "array") -> Any | None:
-    text = text.strip()
-    
-    start_char = '[' if expected_type == "array" else '{'
-    end_char = ']' if expected_type == "array" else '}'
+async def _run_db(func: Callable[..., _T], *args: Any) -> _T:
+    return await asyncio.get_running_loop().run_in_executor(_DB_EXEC, func, *args)
+
+
+def _format_plan(plan: Plan) -> str:
+    cached = _FORMAT_CACHE.get(plan.id)
+    if cached is not None and cached[0] == plan.updated_at:
+        _FORMAT_CACHE.move_to_end(plan.id)
+        return cached[1]
     
-    if text.startswith(start_char):
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
+    formatted = PlanFormatter.format_plan_detailed(plan)
+    _FORMAT_CACHE[plan.id] = (plan.updated_at, formatted)
+    _FORMAT_CACHE.move_to_end(plan.id)
+    if len(_FORMAT_CACHE) > _FORMAT_CACHE_SIZE:
+        _FORMAT_CACHE.popitem(last=False)
+    return formatted
+
+
+def _encode_cursor(cursor: tuple[datetime, int]) -> str:
+    updated_at, plan_id = cursor
+    return f"{plan_id}@{updated_at.isoformat()}"
+
+
+def _decode_cursor(token: str) -> tuple[datetime, int] | None:
+    plan_id, _, updated_at = token.partition("@")
+    try:
+        return datetime.fromisoformat(updated_at), int(plan_id)
+    except ValueError:
+        return None
+
+
+async def _progress(ctx: Context, phase: str, **details: Any) -> None:
+    await ctx.info(_json.dumps({"phase": phase, **details}))
+
+
+def _message(role: str, text: str) -> SamplingMessage:
+    return SamplingMessage(role=role, content=TextContent(type="text", text=text))
+
+
+def _response_text(content: Any) -> str:
+    # ctx.sample returns the content block itself rather than a CreateMessageResult.
+    return content.text if isinstance(content, TextContent) else str(content)
+
+
+def _extract_json_from_text(text: str, expected_type: str = "array") -> Any | None:
+    start_char, end_char = _JSON_DELIMITERS.get(expected_type, _JSON_DELIMITERS["object"])
     
     start_idx = text.find(start_char)
     end_idx = text.rfind(end_char)
     
-    if start_idx != -1 and end_idx > start_idx:
-        try:
-            return json.loads(text[start_idx:end_idx + 1])
-        except json.JSONDecodeError:
-            pass
+    if start_idx < 0 or end_idx <= start_idx:
+        return None
     
-    return None
-
-
-def _create_task_from_dict(task_dict: dict[str, Any], order_index: int, plan_id: int = 0) -> Task:
-    priority_str = task_dict.get("priority", "medium")
     try:
-        priority = Priority(priority_str)
-    except ValueError:
-        priority = Priority.MEDIUM
+        return _json.loads(text[start_idx:end_idx + 1])
+    except json.JSONDecodeError:
+        pass
     
-    return Task(
+    # Trailing prose can contain stray brackets; stop at the first balanced value instead.
+    try:
+        return _RAW_DECODER.raw_decode(text, start_idx)[0]
+    except json.JSONDecodeError:
+        return None
+
+
+def _create_task_from_dict(
+    task_dict: dict[str, Any],
+    order_index: int,
+    plan_id: int = 0
+) -> Task:
+    title = task_dict.get("title")
+    description = task_dict.get("description")
+    priority = task_dict.get("priority", "medium")
+    dependencies = task_dict.get("dependencies")
+    
+    return Task.model_construct(
         plan_id=plan_id,
-        title=task_dict.get("title", f"Task {order_index + 1}"),
-        description=task_dict.get("description"),
-        priority=priority,
+        title=str(title)[:_TITLE_MAX] if title else f"Task {order_index + 1}",
+        description=str(description)[:_DESCRIPTION_MAX] if description else None,
+        priority=_PRIORITY_MAP.get(priority, Priority.MEDIUM) if isinstance(priority, str) else Priority.MEDIUM,
         order_index=order_index,
-        dependencies=task_dict.get("dependencies", [])
+        # Ints and digit strings like "1", as Pydantic's lax mode accepted; bools and floats are dropped.
+        dependencies=[
+            int(dep) for dep in dependencies
+            if type(dep) is int or (isinstance(dep, str) and dep.isdecimal())
+        ] if isinstance(dependencies, list) else []
     )
 
 
+def _build_tasks(tasks_data: list[dict[str, Any]]) -> list[Task]:
+    return [_create_task_from_dict(task_dict, i) for i, task_dict in enumerate(tasks_data)]
+
+
 @mcp.tool()
 async def new_plan(
     title: str,
@@ -87,18 +181,44 @@ async def new_plan(
     if ctx is None:
         return "Error: This tool requires MCP context to generate intelligent task breakdowns. Please use from an MCP client."
     
-    try:
-        plan_category = PlanCategory(category)
-    except ValueError:
-        return f"Invalid category: {category}. Valid categories: {', '.join(c.value for c in PlanCategory)}"
+    plan_category = _CATEGORY_MAP.get(category)
+    if plan_category is None:
+        return f"Invalid category: {category}. Valid categories: {_CATEGORY_CSV}"
     
     db = _get_db()
     engine = PlanningEngine()
     
-    await ctx.info(f"Creating plan: {title}")
-    await ctx.info("Analyzing requirements...")
+    await _progress(ctx, "started", title=title)
+    
+    enhanced_context = additional_context or ""
+    # Templates are keyed on the goal alone, so plans shaped by extra caller detail neither use nor seed them.
+    template_keyword = None if description or additional_context else engine.template_keyword(goal, plan_category)
+    template = None
+    if template_keyword:
+        template = await _run_db(db.get_plan_template, template_keyword)
+    
+    info_len = len(title) + len(goal) + len(description or "") + len(enhanced_context)
+    planning_prompt = PlanningPrompts.get_planning_prompt(
+        goal=goal,
+        category=plan_category,
+        description=description or "",
+        additional_context=enhanced_context
+    )
+    
+    tasks: list[Task] = []
+    speculative_generation: asyncio.Task | None = None
     
-    analysis_prompt = f"""You are an expert project planner analyzing a planning request.
+    if template:
+        tasks = _build_tasks(engine.instantiate_template(template, title, goal))
+        await _progress(ctx, "template_hit", keyword=template_keyword, tasks=len(tasks))
+    elif additional_context or info_len >= _ANALYSIS_SKIP_THRESHOLD:
+        await _progress(ctx, "analysis_skipped", info_len=info_len)
+    else:
+        clarified = False
+        
+        await _progress(ctx, "analysis_start")
+        
+        analysis_prompt = f"""You are an expert project planner analyzing a planning request.
 
 Title: {title}
 Goal: {goal}
@@ -119,99 +239,108 @@ Respond in JSON format:
 }}
 
 Only request clarification if it's truly needed for creating an effective plan."""
-    
-    enhanced_context = additional_context or ""
-    
-    try:
-        analysis_result = await ctx.sample(
-            messages=[{"role": "user", "content": analysis_prompt}],
-            max_tokens=500,
-            temperature=0.3
-        )
-        
-        analysis_text = analysis_result.content.text if hasattr(analysis_result.content, 'text') else str(analysis_result.content)
-        await ctx.debug(f"Analysis response: {analysis_text[:200]}...")
         
-        analysis_data = _extract_json_from_text(analysis_text, "object")
-        if not analysis_data:
-            analysis_data = {"has_sufficient_info": True, "missing_info": [], "specific_questions": []}
+        # Generate alongside the analysis (the task first runs once the analysis request is sent);
+        # the result is only dropped if clarification changes the prompt.
+        speculative_generation = asyncio.create_task(ctx.sample(
+            messages=[_message("user", planning_prompt)],
+            max_tokens=2000,
+            temperature=0.7
+        ))
         
-        if not analysis_data.get("has_sufficient_info", True) and analysis_data.get("specific_questions"):
-            await ctx.info(f"LLM needs clarification: {analysis_data.get('reasoning', 'Missing critical information')}")
+        try:
+            analysis_result = await ctx.sample(
+                messages=[_message("user", analysis_prompt)],
+                max_tokens=500,
+                temperature=0.3
+            )
+            
+            analysis_text = _response_text(analysis_result)
+            if _DEBUG:
+                await ctx.debug(f"Analysis response: {analysis_text[:200]}...")
             
-            questions = "\n".join(f"{i+1}. {q}" for i, q in enumerate(analysis_data["specific_questions"]))
+            analysis_data = _extract_json_from_text(analysis_text, "object")
+            if not analysis_data:
+                analysis_data = {"has_sufficient_info": True, "missing_info": [], "specific_questions": []}
             
-            clarification_result = await ctx.elicit(
-                f"""To create an effective plan for '{title}', please provide:
+            needs_clarification = not analysis_data.get("has_sufficient_info", True) and bool(analysis_data.get("specific_questions"))
+            
+            if needs_clarification:
+                questions = "\n".join(f"{i+1}. {q}" for i, q in enumerate(analysis_data["specific_questions"]))
+                
+                clarification_result = await ctx.elicit(
+                    f"""To create an effective plan for '{title}', please provide:
 
 {questions}
 
 Enter the information (or press Enter to proceed with best effort):""",
-                response_type=str
-            )
+                    response_type=str
+                )
+                
+                if clarification_result.action == "accept" and clarification_result.data:
+                    enhanced_context += f"\n\nUser clarifications:\n{clarification_result.data}"
+                    clarified = True
             
-            if clarification_result.action == "accept" and clarification_result.data:
-                enhanced_context += f"\n\nUser clarifications:\n{clarification_result.data}"
-                await ctx.info("Additional context received, generating optimized task list...")
-            else:
-                await ctx.info("Proceeding with available information...")
-        else:
-            await ctx.info("Sufficient information provided, generating task list...")
-    
-    except Exception as e:
-        await ctx.warning(f"Analysis phase failed: {str(e)}, proceeding with task generation")
-    
-    await ctx.info("Generating tasks with LLM...")
-    
-    planning_prompt = PlanningPrompts.get_planning_prompt(
-        goal=goal,
-        category=plan_category,
-        description=description or "",
-        additional_context=enhanced_context
-    )
-    
-    tasks: list[Task] = []
-    max_retries = 3
-    
-    for attempt in range(max_retries):
-        try:
-            sample_result = await ctx.sample(
-                messages=[{"role": "user", "content": planning_prompt}],
-                max_tokens=2000,
-                temperature=0.7
+            await _progress(ctx, "analysis_done", needs_clarification=needs_clarification, clarified=clarified)
+        
+        except Exception as e:
+            await ctx.warning(f"Analysis phase failed: {str(e)}, proceeding with task generation")
+        
+        if clarified:
+            speculative_generation.cancel()
+            speculative_generation = None
+            planning_prompt = PlanningPrompts.get_planning_prompt(
+                goal=goal,
+                category=plan_category,
+                description=description or "",
+                additional_context=enhanced_context
             )
-            
-            await ctx.info("Parsing generated tasks...")
-            
-            llm_response = sample_result.content.text if hasattr(sample_result.content, 'text') else str(sample_result.content)
-            await ctx.debug(f"LLM Response (attempt {attempt + 1}): {llm_response[:200]}...")
-            
-            tasks_data = _extract_json_from_text(llm_response, "array")
-            
-            if tasks_data and isinstance(tasks_data, list) and len(tasks_data) > 0:
-                await ctx.info(f"✓ Generated {len(tasks_data)} tasks from LLM")
-                tasks = [_create_task_from_dict(task_dict, i) for i, task_dict in enumerate(tasks_data)]
-                break
-            else:
-                await ctx.warning(f"Attempt {attempt + 1}/{max_retries}: LLM response invalid, retrying...")
+    
+    if not tasks:
+        max_retries = 3
+        generation_messages = [_message("user", planning_prompt)]
+        
+        for attempt in range(max_retries):
+            try:
+                if speculative_generation is not None:
+                    sample_result = await speculative_generation
+                    speculative_generation = None
+                else:
+                    sample_result = await ctx.sample(
+                        messages=generation_messages,
+                        max_tokens=2000,
+                        temperature=0.7
+                    )
+                
+                llm_response = _response_text(sample_result)
+                if _DEBUG:
+                    await ctx.debug(f"LLM Response (attempt {attempt + 1}): {llm_response[:200]}...")
+                
+                tasks_data = _extract_json_from_text(llm_response, "array")
                 
+                if tasks_data and isinstance(tasks_data, list) and len(tasks_data) > 0:
+                    tasks = _build_tasks(tasks_data)
+                    await _progress(ctx, "generation_done", tasks=len(tasks), attempts=attempt + 1)
+                    break
+                else:
+                    await ctx.warning(f"Attempt {attempt + 1}/{max_retries}: LLM response invalid, retrying...")
+                    
+                    if attempt < max_retries - 1:
+                        # Keep the first turn byte-identical so backend prompt caching still hits.
+                        generation_messages[1:] = [_message("user", _JSON_ONLY_REMINDER)]
+                    else:
+                        raise ValueError("LLM failed to generate valid task list after multiple attempts")
+            
+            except Exception as e:
                 if attempt < max_retries - 1:
-                    planning_prompt += "\n\nIMPORTANT: You MUST respond with ONLY a valid JSON array of task objects. No explanations, no markdown, just the JSON array."
+                    await ctx.warning(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}, retrying...")
                 else:
-                    raise ValueError("LLM failed to generate valid task list after multiple attempts")
+                    await ctx.error(f"Failed after {max_retries} attempts: {str(e)}")
+                    return f"❌ Failed to generate plan: LLM could not produce valid task breakdown after {max_retries} attempts.\n\nError: {str(e)}\n\nPlease try again with more specific details or contact support if the issue persists."
         
-        except Exception as e:
-            if attempt < max_retries - 1:
-                await ctx.warning(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}, retrying...")
-            else:
-                await ctx.error(f"Failed after {max_retries} attempts: {str(e)}")
-                return f"❌ Failed to generate plan: LLM could not produce valid task breakdown after {max_retries} attempts.\n\nError: {str(e)}\n\nPlease try again with more specific details or contact support if the issue persists."
-    
     if not tasks:
         return "❌ Failed to generate plan: No valid tasks generated. Please try again with a clearer goal description."
     
-    await ctx.info("Validating plan...")
-    
     plan = Plan(
         title=title,
         description=description,
@@ -223,7 +352,9 @@ Enter the information (or press Enter to proceed with best effort):""",
         tasks=tasks
     )
     
-    preview = PlanFormatter.format_plan_detailed(plan)
+    await _progress(ctx, "validated", tasks=len(tasks))
+    
+    preview = PlanFormatter.format_plan_detailed(plan, max_tasks=_PREVIEW_TASK_LIMIT)
     
     confirmation_result = await ctx.elicit(
         f"""Plan Preview:
@@ -240,32 +371,25 @@ Your response:""",
     )
     
     if confirmation_result.action == "cancel":
-        await ctx.info("Plan creation cancelled by user")
+        await _progress(ctx, "cancelled")
         return "Plan creation cancelled."
     
     if confirmation_result.action == "accept":
-        user_response = confirmation_result.data.lower() if confirmation_result.data else ""
+        user_response = confirmation_result.data or ""
+        response_words = set(re.findall(r"\w+", user_response.casefold()))
         
-        if "cancel" in user_response or "abort" in user_response or "no" == user_response:
-            await ctx.info("Plan creation cancelled by user")
+        if response_words & _CANCEL_WORDS or response_words == {"no"}:
+            await _progress(ctx, "cancelled")
             return "Plan creation cancelled."
         
-        if "yes" not in user_response and len(user_response) > 10:
-            await ctx.info("Regenerating plan with user feedback...")
-            
+        if "yes" not in response_words and len(user_response) > 10:
             regeneration_messages = [
-                {
-                    "role": "user",
-                    "content": f"""{planning_prompt}
-
-Current tasks:
-{json.dumps([{"title": t.title, "priority": t.priority.value, "description": t.description} for t in tasks], indent=2)}
-
-User feedback for improvements:
+                _message("user", planning_prompt),
+                _message("assistant", _json.dumps([{"title": t.title, "priority": t.priority.value, "description": t.description} for t in tasks], indent=True)),
+                _message("user", f"""User feedback for improvements:
 {user_response}
 
-Please regenerate the task list incorporating this feedback."""
-                }
+Please regenerate the task list incorporating this feedback.""")
             ]
             
             try:
@@ -275,69 +399,82 @@ Please regenerate the task list incorporating this feedback."""
                     temperature=0.7
                 )
                 
-                regen_response = regen_result.content.text if hasattr(regen_result.content, 'text') else str(regen_result.content)
+                regen_response = _response_text(regen_result)
                 new_tasks_data = _extract_json_from_text(regen_response, "array")
                 
                 if new_tasks_data and isinstance(new_tasks_data, list):
-                    tasks = [_create_task_from_dict(task_dict, i) for i, task_dict in enumerate(new_tasks_data)]
+                    tasks = _build_tasks(new_tasks_data)
                     plan.tasks = tasks
                     plan.total_tasks = len(tasks)
-                    await ctx.info(f"Regenerated plan with {len(tasks)} tasks")
+                    template = None
+                    await _progress(ctx, "regenerated", tasks=len(tasks))
             
             except Exception as e:
                 await ctx.warning(f"Regeneration failed: {str(e)}, using original tasks")
     
-    await ctx.info("Saving plan to database...")
+    created_plan = await _run_db(db.create_plan, plan)
     
-    created_plan = db.create_plan(plan)
+    if template_keyword and not template:
+        try:
+            await _run_db(db.save_plan_template, template_keyword, plan_category.value, engine.generalize_tasks(created_plan.tasks, title, goal))
+        except Exception as e:
+            await ctx.warning(f"Saving plan template failed: {str(e)}")
     
-    await ctx.info("Plan created successfully!")
+    await _progress(ctx, "saved", plan_id=created_plan.id)
     
-    formatted = PlanFormatter.format_plan_detailed(created_plan)
+    formatted = _format_plan(created_plan)
     return f"Plan created successfully! (ID: {created_plan.id})\n\n{formatted}"
 
 
 @mcp.tool()
-def list_plans(
+async def list_plans(
     include_completed: bool = False,
-    page: int = 1
+    cursor: str | None = None
 ) -> str:
     """List all plans with basic information.
     
     Args:
         include_completed: Include completed plans (default: False, shows only active plans)
-        page: Page number for pagination (30 plans per page, default: 1)
+        cursor: Pagination cursor returned by the previous call (30 plans per page, default: first page)
     """
+    page_cursor = None
+    if cursor:
+        page_cursor = _decode_cursor(cursor)
+        if page_cursor is None:
+            return f"Invalid cursor: {cursor}. Use the cursor value returned by a previous list_plans call."
+    
     db = _get_db()
-    plans = db.get_all_plans(include_completed=include_completed, page=page, page_size=30)
+    plans, next_cursor = await _run_db(partial(db.get_all_plans, include_completed=include_completed, cursor=page_cursor, page_size=30))
     
     if not plans:
         return "No plans found." if not include_completed else "No plans found (try include_completed=False for active plans)."
     
     formatted = PlanFormatter.format_plans_list(plans)
-    footer = f"\nPage {page} | Showing {len(plans)} plans | Use page={page+1} for more"
+    footer = f"\nShowing {len(plans)} plans"
+    if next_cursor:
+        footer += f" | Use cursor=\"{_encode_cursor(next_cursor)}\" for more"
     
     return formatted + footer
 
 
 @mcp.tool()
-def get_plan(plan_id: int) -> str:
+async def get_plan(plan_id: int) -> str:
     """Retrieve detailed information about a specific plan.
     
     Args:
         plan_id: ID of the plan to retrieve
     """
     db = _get_db()
-    plan = db.get_plan(plan_id)
+    plan = await _run_db(db.get_plan, plan_id)
     
     if not plan:
         return f"Plan with ID {plan_id} not found."
     
-    return PlanFormatter.format_plan_detailed(plan)
+    return _format_plan(plan)
 
 
 @mcp.tool()
-def update_task_status(
+async def update_task_status(
     plan_id: int,
     task_ids: list[int],
     status: str,
@@ -351,27 +488,25 @@ def update_task_status(
         status: New status (pending, in_progress, completed, deleted)
         notes: Optional notes about the status change
     """
-    try:
-        task_status = TaskStatus(status)
-    except ValueError:
-        return f"Invalid status: {status}. Valid statuses: {', '.join(s.value for s in TaskStatus)}"
+    task_status = _STATUS_MAP.get(status)
+    if task_status is None:
+        return f"Invalid status: {status}. Valid statuses: {_STATUS_CSV}"
     
     db = _get_db()
-    success = db.update_task_status(task_ids, task_status, notes)
+    success, plan = await _run_db(db.update_task_status_and_fetch, plan_id, task_ids, task_status, notes)
     
     if not success:
         return "Failed to update tasks. Check task IDs."
     
-    plan = db.get_plan(plan_id)
     if not plan:
         return "Tasks updated, but couldn't retrieve plan details."
     
-    formatted = PlanFormatter.format_plan_detailed(plan)
+    formatted = _format_plan(plan)
     return f"Tasks updated successfully!\n\n{formatted}"
 
 
 @mcp.tool()
-def update_plan(
+async def update_plan(
     plan_id: int,
     title: str | None = None,
     description: str | None = None,
@@ -387,49 +522,31 @@ def update_plan(
         new_tasks: List of new task titles to add (optional)
         additional_context: Additional context for the update (optional)
     """
-    db = _get_db()
-    
-    if title or description:
-        db.update_plan_info(plan_id, title, description)
+    tasks = [Task.bulk_new(plan_id, task_title[:_TITLE_MAX]) for task_title in new_tasks or () if task_title]
     
-    if new_tasks:
-        tasks = [
-            Task(
-                plan_id=plan_id,
-                title=task_title,
-                priority=Priority.MEDIUM
-            )
-            for task_title in new_tasks
-        ]
-        db.add_tasks_to_plan(plan_id, tasks)
-    
-    plan = db.get_plan(plan_id)
+    db = _get_db()
+    plan = await _run_db(db.update_plan_and_fetch, plan_id, title, description, tasks)
     if not plan:
         return "Plan not found."
     
-    formatted = PlanFormatter.format_plan_detailed(plan)
+    formatted = _format_plan(plan)
     return f"Plan updated successfully!\n\n{formatted}"
 
 
 @mcp.tool()
-def delete_plan(plan_id: int) -> str:
+async def delete_plan(plan_id: int) -> str:
     """Delete a plan and all its tasks from the database.
     
     Args:
         plan_id: ID of the plan to delete
     """
     db = _get_db()
-    plan = db.get_plan(plan_id)
-    if not plan:
+    plan_title = await _run_db(db.delete_plan_returning_title, plan_id)
+    if plan_title is None:
         return f"Plan {plan_id} not found."
     
-    plan_title = plan.title
-    success = db.delete_plan(plan_id)
-    
-    if success:
-        return f"Plan '{plan_title}' (ID: {plan_id}) has been permanently deleted from the database."
-    else:
-        return f"Failed to delete plan {plan_id}."
+    _FORMAT_CACHE.pop(plan_id, None)
+    return f"Plan '{plan_title}' (ID: {plan_id}) has been permanently deleted from the database."
 
 
 def main() -> None:
@@ -1,7 +1,16 @@
 import pytest
+import sqlite3
 from datetime import datetime
 
-from src.planer_mcp import DatabaseManager, Plan, Task, PlanCategory, TaskStatus, Priority
+from fastmcp import Client
+from fastmcp.client.elicitation import ElicitResult
+from sqlalchemy import event
+
+from src.planer_mcp import DatabaseManager, Plan, Task, PlanCategory, TaskStatus, Priority, PlanningEngine, PlanFormatter
+from src.planer_mcp import server
+from src.planer_mcp.prompts import PlanningPrompts
+from src.planer_mcp.prompts.templates import _category_template
+from src.planer_mcp.server import _create_task_from_dict, _extract_json_from_text
 
 @pytest.fixture
 def db_manager(tmp_path):
@@ -55,6 +64,46 @@ def test_get_plan(db_manager, sample_plan):
     assert retrieved_plan.title == sample_plan.title
     assert len(retrieved_plan.tasks) == 2
 
+def test_get_plan_returns_independent_copies(db_manager, sample_plan):
+    created_plan = db_manager.create_plan(sample_plan)
+    
+    first = db_manager.get_plan(created_plan.id)
+    first.tasks[0].title = "Mutated"
+    
+    second = db_manager.get_plan(created_plan.id)
+    assert second.tasks[0].title == "Task 1"
+    assert second is not first
+
+def test_task_dependencies_round_trip(db_manager, sample_plan):
+    created_plan = db_manager.create_plan(sample_plan)
+    retrieved_plan = db_manager.get_plan(created_plan.id)
+    
+    assert retrieved_plan.tasks[0].dependencies == []
+    assert retrieved_plan.tasks[1].dependencies == [0]
+    
+    with sqlite3.connect(db_manager.engine.url.database) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM tasks WHERE dependencies IS NOT NULL").fetchone() == (0,)
+
+def test_create_plan_inserts_tasks_in_one_statement(db_manager):
+    statements = []
+    
+    @event.listens_for(db_manager.engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO tasks"):
+            statements.append(statement)
+    
+    plan = Plan(
+        title="Mixed",
+        category=PlanCategory.PROJECT,
+        goal="Mixed descriptions",
+        tasks=[Task(plan_id=0, title=f"Task {i}", description="Details" if i % 2 else None) for i in range(7)]
+    )
+    created_plan = db_manager.create_plan(plan)
+    
+    assert len(statements) == 1
+    retrieved_plan = db_manager.get_plan(created_plan.id)
+    assert [task.description for task in retrieved_plan.tasks] == [task.description for task in plan.tasks]
+
 def test_get_all_plans(db_manager, sample_plan):
     db_manager.create_plan(sample_plan)
     
@@ -66,8 +115,9 @@ def test_get_all_plans(db_manager, sample_plan):
     )
     db_manager.create_plan(sample_plan2)
     
-    all_plans = db_manager.get_all_plans()
+    all_plans, next_cursor = db_manager.get_all_plans()
     assert len(all_plans) == 2
+    assert next_cursor is None
 
 def test_get_all_plans_pagination(db_manager, sample_plan):
     for i in range(35):
@@ -79,11 +129,61 @@ def test_get_all_plans_pagination(db_manager, sample_plan):
         )
         db_manager.create_plan(plan)
     
-    page1 = db_manager.get_all_plans(page=1, page_size=30)
+    page1, cursor = db_manager.get_all_plans(page_size=30)
     assert len(page1) == 30
+    assert cursor == (page1[-1].updated_at, page1[-1].id)
     
-    page2 = db_manager.get_all_plans(page=2, page_size=30)
+    page2, cursor = db_manager.get_all_plans(cursor=cursor, page_size=30)
     assert len(page2) == 5
+    assert cursor is None
+    
+    seen_ids = {plan.id for plan in page1} | {plan.id for plan in page2}
+    assert len(seen_ids) == 35
+    
+    for i in range(25):
+        db_manager.create_plan(Plan(title=f"Extra {i}", category=PlanCategory.PROJECT, goal="Goal", tasks=[]))
+    
+    _, cursor = db_manager.get_all_plans(page_size=30)
+    last_page, cursor = db_manager.get_all_plans(cursor=cursor, page_size=30)
+    assert len(last_page) == 30
+    assert cursor is None
+
+def test_pagination_over_legacy_timestamps(tmp_path):
+    db_path = tmp_path / "legacy.db"
+    DatabaseManager(str(db_path)).engine.dispose()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO plans (title, category, goal, status, total_tasks, completed_tasks, progress_pct, created_at, updated_at) "
+            "VALUES (?, 'project', 'Goal', 'pending', 0, 0, 0.0, ?, ?)",
+            [(f"Legacy {i}", "2026-10-15 10:55:50", f"2026-10-15 10:55:5{i % 3}") for i in range(7)]
+        )
+    
+    db_manager = DatabaseManager(str(db_path))
+    seen_ids = []
+    cursor = None
+    for _ in range(5):
+        page, cursor = db_manager.get_all_plans(cursor=cursor, page_size=3)
+        seen_ids += [plan.id for plan in page]
+        if cursor is None:
+            break
+    
+    assert cursor is None
+    assert sorted(seen_ids) == list(range(1, 8))
+
+def test_statistics_collected_only_when_missing(tmp_path, sample_plan):
+    db_path = tmp_path / "stats.db"
+    db_manager = DatabaseManager(str(db_path))
+    db_manager.create_plan(sample_plan)
+    db_manager.engine.dispose()
+    
+    DatabaseManager(str(db_path)).engine.dispose()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+        conn.execute("UPDATE sqlite_stat1 SET stat = '1 1' WHERE idx = 'idx_tasks_status'")
+    
+    DatabaseManager(str(db_path)).engine.dispose()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT stat FROM sqlite_stat1 WHERE idx = 'idx_tasks_status'").fetchone() == ("1 1",)
 
 def test_update_task_status(db_manager, sample_plan):
     created_plan = db_manager.create_plan(sample_plan)
@@ -94,6 +194,7 @@ def test_update_task_status(db_manager, sample_plan):
     
     updated_plan = db_manager.get_plan(created_plan.id)
     assert updated_plan.completed_tasks == 1
+    assert updated_plan.progress_percentage == 50.0
     assert updated_plan.tasks[0].status == TaskStatus.COMPLETED
 
 def test_completed_plan_filtering(db_manager):
@@ -108,10 +209,10 @@ def test_completed_plan_filtering(db_manager):
     created = db_manager.create_plan(completed_plan)
     db_manager.update_task_status([created.tasks[0].id], TaskStatus.COMPLETED)
     
-    active_plans = db_manager.get_all_plans(include_completed=False)
+    active_plans, _ = db_manager.get_all_plans(include_completed=False)
     assert len(active_plans) == 0
     
-    all_plans = db_manager.get_all_plans(include_completed=True)
+    all_plans, _ = db_manager.get_all_plans(include_completed=True)
     assert len(all_plans) == 1
 
 def test_add_tasks_to_plan(db_manager, sample_plan):
@@ -131,6 +232,9 @@ def test_add_tasks_to_plan(db_manager, sample_plan):
     
     updated_plan = db_manager.get_plan(created_plan.id)
     assert updated_plan.total_tasks == 3
+    assert [task.order_index for task in updated_plan.tasks] == [0, 1, 2]
+    
+    assert db_manager.add_tasks_to_plan(created_plan.id + 1, new_tasks) is False
 
 def test_update_plan_info(db_manager, sample_plan):
     created_plan = db_manager.create_plan(sample_plan)
@@ -146,6 +250,30 @@ def test_update_plan_info(db_manager, sample_plan):
     assert updated_plan.title == "Updated Title"
     assert updated_plan.description == "Updated description"
 
+def test_update_and_fetch(db_manager, sample_plan):
+    created_plan = db_manager.create_plan(sample_plan)
+    
+    success, plan = db_manager.update_task_status_and_fetch(
+        created_plan.id, [created_plan.tasks[0].id], TaskStatus.COMPLETED
+    )
+    assert success is True
+    assert plan.tasks[0].status == TaskStatus.COMPLETED
+    assert plan.completed_tasks == 1
+    
+    assert db_manager.update_task_status_and_fetch(created_plan.id, [9999], TaskStatus.COMPLETED) == (False, None)
+    
+    plan = db_manager.update_plan_and_fetch(
+        created_plan.id,
+        title="Renamed",
+        new_tasks=[Task.bulk_new(created_plan.id, "Task 3")]
+    )
+    assert plan.title == "Renamed"
+    assert plan.total_tasks == 3
+    assert [task.title for task in plan.tasks] == ["Task 1", "Task 2", "Task 3"]
+    assert db_manager.get_plan(created_plan.id).title == "Renamed"
+    
+    assert db_manager.update_plan_and_fetch(9999, title="Missing") is None
+
 def test_delete_plan(db_manager, sample_plan):
     created_plan = db_manager.create_plan(sample_plan)
     
@@ -154,6 +282,19 @@ def test_delete_plan(db_manager, sample_plan):
     
     deleted_plan = db_manager.get_plan(created_plan.id)
     assert deleted_plan is None
+    
+    with db_manager.engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM tasks").scalar() == 0
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM task_dependencies").scalar() == 0
+    
+    assert db_manager.delete_plan(created_plan.id) is False
+
+def test_delete_plan_returning_title(db_manager, sample_plan):
+    created_plan = db_manager.create_plan(sample_plan)
+    
+    assert db_manager.delete_plan_returning_title(created_plan.id) == "Test Project"
+    assert db_manager.get_plan(created_plan.id) is None
+    assert db_manager.delete_plan_returning_title(created_plan.id) is None
 
 def test_plan_progress_percentage(sample_plan):
     sample_plan.total_tasks = 10
@@ -176,3 +317,260 @@ def test_plan_is_completed():
     
     plan.completed_tasks = 1
     assert plan.is_completed is False
+
+def test_parse_llm_tasks():
+    engine = PlanningEngine()
+    
+    tasks = engine.parse_llm_tasks(
+        '[{"title": "Design schema", "priority": "high"}, '
+        '{"title": "Write API", "description": "REST endpoints", "dependencies": [0]}]'
+    )
+    assert [task.title for task in tasks] == ["Design schema", "Write API"]
+    assert tasks[0].priority == Priority.HIGH
+    assert tasks[1].priority == Priority.MEDIUM
+    assert tasks[1].dependencies == [0]
+    
+    assert engine.parse_llm_tasks("not json") == []
+    assert engine.parse_llm_tasks('{"title": "not a list"}') == []
+
+def test_extract_json_from_text():
+    assert _extract_json_from_text('Here you go:\n```json\n[{"title": "A"}]\n```') == [{"title": "A"}]
+    assert _extract_json_from_text('  {"has_sufficient_info": true}  ', "object") == {"has_sufficient_info": True}
+    assert _extract_json_from_text("no json here") is None
+    assert _extract_json_from_text("[not, valid]") is None
+    assert _extract_json_from_text('[{"title": "A"}]\n\nNote: see [docs] for details') == [{"title": "A"}]
+
+def test_create_task_from_dict():
+    task = _create_task_from_dict({
+        "title": "T" * 250,
+        "description": "D" * 1200,
+        "priority": "urgent",
+        "dependencies": [0, "1", True, 2.0, "x", None, 3]
+    }, order_index=4, plan_id=7)
+    
+    assert task.title == "T" * 200
+    assert task.description == "D" * 1000
+    assert task.priority == Priority.MEDIUM
+    assert task.dependencies == [0, 1, 3]
+    assert (task.order_index, task.plan_id, task.status) == (4, 7, TaskStatus.PENDING)
+    
+    fallback = _create_task_from_dict({"title": "", "priority": 2, "dependencies": "0"}, order_index=1)
+    assert fallback.title == "Task 2"
+    assert fallback.description is None
+    assert fallback.priority == Priority.MEDIUM
+    assert fallback.dependencies == []
+
+def test_plan_template_round_trip(db_manager, sample_plan):
+    engine = PlanningEngine()
+    keyword = engine.template_keyword("Build a REST API for the inventory service", PlanCategory.BACKEND)
+    assert keyword == "backend:rest-api-inventory"
+    assert engine.template_keyword("Build a new app", PlanCategory.BACKEND) is None
+    assert engine.template_keyword("构建库存服务", PlanCategory.BACKEND) is None
+    assert engine.template_keyword("Créer une API REST", PlanCategory.BACKEND) == "backend:créer-une-api"
+    assert db_manager.get_plan_template(keyword) is None
+    
+    sample_plan.tasks[0].title = "Scope Test Project"
+    template = engine.generalize_tasks(sample_plan.tasks, sample_plan.title, sample_plan.goal)
+    assert template[0]["title"] == "Scope {title}"
+    db_manager.save_plan_template(keyword, PlanCategory.BACKEND.value, template)
+    
+    cached = db_manager.get_plan_template(keyword)
+    assert cached == template
+    
+    tasks = engine.instantiate_template(cached, "Inventory API", "Ship it")
+    assert tasks[0]["title"] == "Scope Inventory API"
+    assert [task["title"] for task in tasks[1:]] == [task.title for task in sample_plan.tasks[1:]]
+
+@pytest.fixture
+def server_db(tmp_path, monkeypatch):
+    db = DatabaseManager(str(tmp_path / "server.db"))
+    monkeypatch.setattr(server, "_DB", db)
+    return db
+
+async def call_new_plan(sampling_handler, elicitation_handler, **arguments):
+    async with Client(server.mcp, sampling_handler=sampling_handler, elicitation_handler=elicitation_handler) as client:
+        result = await client.call_tool("new_plan", {"category": "backend", **arguments})
+    return result.content[0].text
+
+async def test_new_plan_reuses_template(server_db):
+    prompts = []
+    
+    async def sampling_handler(messages, params, context):
+        text = messages[-1].content.text
+        prompts.append(text)
+        if "Analyze this request" in text:
+            return '{"has_sufficient_info": true, "missing_info": [], "specific_questions": []}'
+        return '[{"title": "Design schema", "priority": "high"}, {"title": "Write endpoints", "dependencies": [0]}]'
+    
+    async def elicitation_handler(message, response_type, params, context):
+        return {"value": "yes"}
+    
+    async def create(title, goal):
+        return await call_new_plan(sampling_handler, elicitation_handler, title=title, goal=goal)
+    
+    assert "Plan created successfully" in await create("Inventory", "Build a REST API for the inventory service")
+    assert len(prompts) == 2
+    
+    prompts.clear()
+    assert "Plan created successfully" in await create("Orders", "Build a REST API for inventory tracking")
+    assert prompts == []
+    
+    assert "Plan created successfully" in await create("Tiny", "Make an app")
+    assert len(prompts) == 2
+    assert server_db.get_plan_template("backend:app") is None
+
+async def test_new_plan_template_skipped_with_caller_detail(server_db, monkeypatch):
+    prompts = []
+    
+    async def sampling_handler(messages, params, context):
+        prompts.append(messages[-1].content.text)
+        return '[{"title": "Design schema"}]'
+    
+    async def elicitation_handler(message, response_type, params, context):
+        return {"value": "yes"}
+    
+    goal = "Build a REST API for the inventory service"
+    keyword = PlanningEngine().template_keyword(goal, PlanCategory.BACKEND)
+    
+    result = await call_new_plan(sampling_handler, elicitation_handler, title="Inventory", goal=goal,
+                                 description="Multi-tenant, event sourced, with audit trails for every stock movement")
+    assert "Plan created successfully" in result
+    assert prompts
+    assert server_db.get_plan_template(keyword) is None
+    
+    def failing_save(*args):
+        raise RuntimeError("disk full")
+    
+    monkeypatch.setattr(server_db, "save_plan_template", failing_save)
+    result = await call_new_plan(sampling_handler, elicitation_handler, title="Inventory", goal=goal)
+    assert "Plan created successfully" in result
+    assert len(server_db.get_all_plans()[0]) == 2
+
+@pytest.mark.parametrize("reply, outcome, regenerated", [
+    ("no", "Plan creation cancelled.", False),
+    ("cancel please", "Plan creation cancelled.", False),
+    ("yes", "Plan created successfully", False),
+    ("Add a Rollout step, no load tests needed", "Plan created successfully", True),
+])
+async def test_new_plan_confirmation_replies(server_db, reply, outcome, regenerated):
+    feedback = []
+    
+    async def sampling_handler(messages, params, context):
+        text = messages[-1].content.text
+        if "Analyze this request" in text:
+            return '{"has_sufficient_info": true}'
+        if len(messages) == 3:
+            feedback.append(text)
+            return '[{"title": "Design schema"}, {"title": "Rollout"}]'
+        return '[{"title": "Design schema"}]'
+    
+    async def elicitation_handler(message, response_type, params, context):
+        return {"value": reply}
+    
+    result = await call_new_plan(sampling_handler, elicitation_handler, title="Launch", goal="Ship it")
+    
+    assert result.startswith(outcome)
+    assert bool(feedback) == regenerated
+    if regenerated:
+        assert reply in feedback[0]
+        assert "Rollout" in result
+    if outcome.startswith("Plan creation cancelled"):
+        assert server_db.get_all_plans()[0] == []
+
+def clarifying_sampler(generation_prompts):
+    async def sampling_handler(messages, params, context):
+        text = messages[-1].content.text
+        if "Analyze this request" in text:
+            return '{"has_sufficient_info": false, "specific_questions": ["Which database?"]}'
+        generation_prompts.append(text)
+        if "User clarifications" in text:
+            return '[{"title": "Provision Postgres"}]'
+        return '[{"title": "Pick a database"}]'
+    
+    return sampling_handler
+
+async def test_new_plan_clarification_replaces_speculative_generation(server_db):
+    generation_prompts = []
+    replies = iter([{"value": "Postgres on RDS"}, {"value": "yes"}])
+    
+    async def elicitation_handler(message, response_type, params, context):
+        return next(replies)
+    
+    result = await call_new_plan(clarifying_sampler(generation_prompts), elicitation_handler, title="Inventory", goal="Ship it")
+    
+    assert "Provision Postgres" in result
+    assert "Pick a database" not in result
+    assert "User clarifications" not in generation_prompts[0]
+    assert "Postgres on RDS" in generation_prompts[-1]
+
+async def test_new_plan_declined_clarification_reuses_speculative_generation(server_db):
+    generation_prompts = []
+    replies = iter([ElicitResult(action="decline"), {"value": "yes"}])
+    
+    async def elicitation_handler(message, response_type, params, context):
+        return next(replies)
+    
+    result = await call_new_plan(clarifying_sampler(generation_prompts), elicitation_handler, title="Inventory", goal="Ship it")
+    
+    assert "Pick a database" in result
+    assert len(generation_prompts) == 1
+
+async def test_new_plan_skips_analysis_for_detailed_requests(server_db):
+    prompts = []
+    
+    async def sampling_handler(messages, params, context):
+        prompts.append(messages[-1].content.text)
+        return '[{"title": "Design schema"}]'
+    
+    async def elicitation_handler(message, response_type, params, context):
+        return {"value": "yes"}
+    
+    description = "Stock levels per warehouse, reservations on checkout, nightly reconciliation. " * 4
+    assert len(description) >= server._ANALYSIS_SKIP_THRESHOLD
+    result = await call_new_plan(sampling_handler, elicitation_handler, title="Inventory", goal="Ship it", description=description)
+    
+    assert "Plan created successfully" in result
+    assert len(prompts) == 1
+    assert "Analyze this request" not in prompts[0]
+
+def test_generalize_tasks_matches_whole_words_only():
+    engine = PlanningEngine()
+    tasks = [
+        Task(plan_id=0, title="Set up application scaffolding", description="Happy path first"),
+        Task(plan_id=0, title="Document the rapid API", description="Ship the App to API users")
+    ]
+    
+    template = engine.generalize_tasks(tasks, "App", "API")
+    assert template[0] == {
+        "title": "Set up application scaffolding",
+        "description": "Happy path first",
+        "priority": "medium",
+        "dependencies": []
+    }
+    assert template[1]["title"] == "Document the rapid {goal}"
+    assert template[1]["description"] == "Ship the {title} to {goal} users"
+    
+    filled = engine.instantiate_template(template, "Payments service", "billing")
+    assert filled[0]["title"] == "Set up application scaffolding"
+    assert filled[1]["description"] == "Ship the Payments service to billing users"
+
+def test_planning_prompt_keeps_literal_braces_in_guidance(monkeypatch):
+    guidance = 'Return errors as {"error": "message"}.'
+    monkeypatch.setitem(PlanningPrompts.CATEGORY_SPECIFIC, PlanCategory.BACKEND, guidance)
+    _category_template.cache_clear()
+    try:
+        prompt = PlanningPrompts.get_planning_prompt("Ship the API", PlanCategory.BACKEND)
+    finally:
+        _category_template.cache_clear()
+    
+    assert prompt.endswith(guidance)
+    assert "Ship the API" in prompt
+
+def test_format_plan_detailed_max_tasks(sample_plan):
+    full = PlanFormatter.format_plan_detailed(sample_plan)
+    assert "Task 2" in full and "more tasks" not in full
+    
+    preview = PlanFormatter.format_plan_detailed(sample_plan, max_tasks=1)
+    assert "Task 1" in preview
+    assert "Task 2" not in preview
+    assert preview.endswith("... and 1 more tasks")